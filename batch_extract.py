@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from chunked_extract import DEFAULT_CONTEXT_TOKENS, DEFAULT_RESERVE_TOKENS, chunk_bodies, chunk_chars, merge_fields, page_chunks
+from disk_cache import DEFAULT_CACHE_ROOT, DiskCache
+from docx_template import get_fill_plan
+from llm_client import (CHAT_COMPLETIONS_URL, DEFAULT_CACHE_TTL, DEFAULT_CONCURRENCY, DEFAULT_MODEL, ResponseCache,
+                        make_session, run_chats)
+from pdf_extract import DEFAULT_WORKERS, iter_pages
+from text_cleanup import normalize_pages
+
+# shared with the app when both use the default cache root
+DEFAULT_RESPONSE_CACHE = os.path.join(DEFAULT_CACHE_ROOT, "llm-responses")
+
+
+# === CLAIMS ===
+# A claim is one PDF, or a directory whose PDFs together make up the claim.
+def claim_files(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".pdf"))
+    return [path]
+
+
+def claim_pages(claims, max_workers=None):
+    files = []
+    owners = []
+    for index, claim in enumerate(claims):
+        for path in claim_files(claim):
+            files.append(path)
+            owners.append(index)
+    pages = [[] for _ in claims]
+    for record in normalize_pages(iter_pages(files, max_workers, photo_captions=True)):
+        pages[owners[record[0]]].append(record)
+    return pages
+
+
+# === EXTRACT ===
+# Each claim is cut into page-aligned chunks of at most chunk_limit
+# characters, and the requests for every chunk of every claim are fired
+# through the concurrent client together, then merged per claim. Yields
+# (claim, field dict or the first failed request's exception) in claim order.
+def extract_claims(session, claims, placeholders, max_concurrency=DEFAULT_CONCURRENCY, chunk_limit=None,
+                   model=DEFAULT_MODEL, url=CHAT_COMPLETIONS_URL, max_workers=None, cache=None):
+    chunk_limit = chunk_limit or chunk_chars()
+    bodies = []
+    spans = []
+    for records in claim_pages(claims, max_workers):
+        claim_bodies = chunk_bodies(page_chunks(records, chunk_limit), placeholders, model=model)
+        spans.append((len(bodies), len(bodies) + len(claim_bodies)))
+        bodies.extend(claim_bodies)
+    results = run_chats(session, bodies, max_concurrency, url, cache=cache)
+    for claim, (start, stop) in zip(claims, spans):
+        answers = results[start:stop]
+        failures = [answer for answer in answers if isinstance(answer, Exception)]
+        if failures:
+            yield claim, failures[0]
+        else:
+            yield claim, merge_fields([answer for answer in answers if isinstance(answer, dict)])[0]
+
+
+# === CLI ===
+# Writes JSONL records ready for batch_fill.py, each with a "source" field
+# naming its claim (usable as --name-field there).
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract GuideOne field values for many claims at once.")
+    parser.add_argument("template", help="template .docx whose placeholders are extracted")
+    parser.add_argument("claims", nargs="+", help="claim PDFs, or directories of PDFs (one claim per directory)")
+    parser.add_argument("--out", default="-", help="JSONL file to write the records to ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="LLM requests in flight at once")
+    parser.add_argument("--context-tokens", type=int, default=DEFAULT_CONTEXT_TOKENS, help="model context window")
+    parser.add_argument("--reserve-tokens", type=int, default=DEFAULT_RESERVE_TOKENS, help="tokens kept for instructions and answer")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--url", default=CHAT_COMPLETIONS_URL, help="chat-completions endpoint")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="PDF extraction processes")
+    parser.add_argument("--cache-dir", default=DEFAULT_RESPONSE_CACHE, help="LLM response cache directory")
+    parser.add_argument("--cache-ttl", type=int, default=DEFAULT_CACHE_TTL, help="seconds a cached response is reused, 0 for no cache")
+    args = parser.parse_args(argv)
+    cache = ResponseCache(DiskCache(args.cache_dir), args.cache_ttl) if args.cache_ttl else None
+
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key and args.url == CHAT_COMPLETIONS_URL:
+        parser.error("OPENROUTER_API_KEY is not set")
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    with open(args.template, "rb") as f:
+        placeholders = get_fill_plan(f.read())["placeholders"]
+
+    start = time.perf_counter()
+    failed = 0
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        with make_session(max(args.concurrency, 1), headers=headers) as session:
+            chunk_limit = chunk_chars(args.context_tokens, args.reserve_tokens)
+            for claim, result in extract_claims(session, args.claims, placeholders, args.concurrency, chunk_limit,
+                                                args.model, args.url, args.workers, cache):
+                if isinstance(result, Exception):
+                    failed += 1
+                    print(f"{claim}: {result}", file=sys.stderr)
+                    continue
+                out.write(json.dumps({"source": os.path.splitext(os.path.basename(claim.rstrip(os.sep)))[0], **result}) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    hits = f", {cache.hits} from cache" if cache else ""
+    print(f"{len(args.claims) - failed} of {len(args.claims)} claims in {elapsed:.2f}s{hits}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+
+from disk_cache import content_key
+from docx_template import fill_with_plan, get_fill_plan
+from pdf_extract import DEFAULT_WORKERS, get_pool
+
+DEFAULT_CHUNK = 8
+
+
+# === RECORDS ===
+# One field_values dict per claim, from JSONL (one object per line) or CSV
+# (one column per placeholder, without the brackets).
+def read_records(stream, fmt):
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if key and value not in (None, "")}
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def record_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+# === WORKERS ===
+# Workers get the template path and read and hash it once per process (the
+# pool outlives a batch, so the file's mtime and size are part of the key).
+# Only the latest template is kept: each batch brings its own temp copy, so
+# older entries would only pile up. Its parsed parts then stay in the
+# worker's tree pool between chunks.
+_templates = {}
+
+
+def _template(path):
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _templates:
+        _templates.clear()
+        with open(path, "rb") as f:
+            data = f.read()
+        _templates[key] = (data, content_key(data))
+    return _templates[key]
+
+
+def _render_chunk(template_path, plan, chunk):
+    template, key = _template(template_path)
+    return [(index, fill_with_plan(template, plan, values, key=key).getvalue()) for index, values in chunk]
+
+
+def _chunks(records, size):
+    chunk = []
+    for item in enumerate(records):
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# === BATCH RENDER ===
+# Yields (index, docx bytes) in record order. At most two chunks per worker
+# are in flight, so a slow consumer never has hundreds of filled documents
+# waiting in memory.
+def render_batch(template_path, records, max_workers=None, chunk_size=DEFAULT_CHUNK):
+    template, _ = _template(template_path)
+    plan = get_fill_plan(template)
+    workers = max_workers or DEFAULT_WORKERS
+    chunks = _chunks(records, chunk_size)
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _render_chunk(template_path, plan, chunk)
+        return
+
+    pool = get_pool(workers)
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(_render_chunk, template_path, plan, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def output_name(index, values, name_field=None):
+    name = str(values.get(name_field, "")).strip() if name_field else ""
+    name = "".join(c if c.isalnum() or c in "-_ ." else "_" for c in name).strip(" .")
+    return f"{name or f'report_{index + 1:05d}'}.docx"
+
+
+def unique_name(name, seen):
+    stem, ext = os.path.splitext(name)
+    candidate = name
+    n = 2
+    while candidate in seen:
+        candidate = f"{stem} ({n}){ext}"
+        n += 1
+    seen.add(candidate)
+    return candidate
+
+
+# === OUTPUTS ===
+def write_directory(results, records, directory, name_field=None):
+    os.makedirs(directory, exist_ok=True)
+    seen = set()
+    count = 0
+    for index, data in results:
+        name = unique_name(output_name(index, records[index], name_field), seen)
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(data)
+        count += 1
+    return count
+
+
+# === STREAMED ZIP ===
+# zipfile writes into this non-seekable sink (so it uses data descriptors
+# instead of seeking back), and iter_zip hands the bytes on after every
+# member. Each filled document is dropped as soon as it is in the archive.
+class _ZipSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# .docx members are already deflated, so they are stored as-is
+def iter_zip(results, records, name_field=None, names=None):
+    sink = _ZipSink()
+    seen = set()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zout:
+        for index, data in results:
+            name = unique_name(output_name(index, records[index], name_field), seen)
+            zout.writestr(name, data)
+            if names is not None:
+                names.append(name)
+            yield sink.drain()
+    yield sink.drain()
+
+
+# target is a path or a writable binary file object
+def write_zip(results, records, target, name_field=None):
+    names = []
+    out = open(target, "wb") if isinstance(target, str) else target
+    try:
+        for chunk in iter_zip(results, records, name_field, names):
+            out.write(chunk)
+    finally:
+        if out is not target:
+            out.close()
+    return len(names)
+
+
+# === CLI ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill one GuideOne template for many claim records.")
+    parser.add_argument("template", help="template .docx")
+    parser.add_argument("records", help="JSONL or CSV of field values, one claim per line/row ('-' for stdin JSONL)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--out", help="directory to write the filled reports to")
+    output.add_argument("--zip", help="zip file to stream the filled reports into ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK)
+    parser.add_argument("--name-field", help="record field used as the output file name")
+    args = parser.parse_args(argv)
+
+    if args.records == "-":
+        records = list(read_records(sys.stdin, "jsonl"))
+    else:
+        with open(args.records, newline="", encoding="utf-8") as f:
+            records = list(read_records(f, record_format(args.records)))
+
+    start = time.perf_counter()
+    results = render_batch(args.template, records, args.workers, args.chunk_size)
+    if args.out:
+        count = write_directory(results, records, args.out, args.name_field)
+    elif args.zip == "-":
+        count = write_zip(results, records, sys.stdout.buffer, args.name_field)
+    else:
+        count = write_zip(results, records, args.zip, args.name_field)
+    elapsed = time.perf_counter() - start
+    print(f"{count} documents in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.1f} documents/second)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
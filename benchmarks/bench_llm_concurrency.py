@@ -0,0 +1,78 @@
+"""Concurrent chat-completions calls against a mock server with latency.
+
+    python benchmarks/bench_llm_concurrency.py [requests] [latency_ms]
+
+Each mock answer echoes the request's field list back, so the run also
+checks that results come back in request order. With latency L, n requests
+take about n * L sequentially and n / concurrency * L through run_chats.
+The map-reduce section runs extract_chunked over reports of growing length:
+wall time follows chunks / concurrency, not the page count.
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_llm_session import StandIn, serve  # noqa: E402
+from chunked_extract import chunk_chars, extract_chunked, page_chunks  # noqa: E402
+from llm_client import build_prompt, chat_body, make_session, post_chat, run_chats  # noqa: E402
+
+REQUESTS = 32
+LATENCY_MS = 200
+CONCURRENCY = [1, 4, 8, 16]
+REPORT_PAGES = [100, 400, 1600]
+PAGE = "The roof covering shows wind creased shingles on the north slope.\n" * 40
+
+
+class SlowStandIn(StandIn):
+    latency = LATENCY_MS / 1000
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        # the field list is the prompt's third line, "['XM8_FIELD_3']"
+        field = body["messages"][0]["content"].splitlines()[3].strip("[]'")
+        reply = json.dumps({"choices": [{"message": {"content": json.dumps({field: "ok"})}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    SlowStandIn.latency = (int(sys.argv[2]) if len(sys.argv) > 2 else LATENCY_MS) / 1000
+    server, url = serve(SlowStandIn)
+    fields = [f"XM8_FIELD_{i}" for i in range(count)]
+    bodies = [chat_body(build_prompt("report text " * 200, [field])) for field in fields]
+    print(f"{count} requests, {SlowStandIn.latency * 1e3:.0f} ms server latency (seconds)")
+    try:
+        with make_session(max(CONCURRENCY)) as session:
+            start = time.perf_counter()
+            for body in bodies:
+                post_chat(session, body, url)
+            print(f"{'sequential':>16} {time.perf_counter() - start:>8.2f}")
+            for concurrency in CONCURRENCY:
+                start = time.perf_counter()
+                results = run_chats(session, bodies, concurrency, url)
+                elapsed = time.perf_counter() - start
+                assert results == [{field: "ok"} for field in fields]
+                print(f"{f'concurrency {concurrency}':>16} {elapsed:>8.2f}")
+
+            print()
+            print("map-reduce over a report (seconds)")
+            print(f"{'pages':>6} {'chunks':>6}" + "".join(f"{f'c={c}':>8}" for c in CONCURRENCY))
+            for pages in REPORT_PAGES:
+                chunks = page_chunks([(0, i, PAGE) for i in range(pages)], chunk_chars(8192, 1024))
+                row = f"{pages:>6} {len(chunks):>6}"
+                for concurrency in CONCURRENCY:
+                    start = time.perf_counter()
+                    merged, _, failures = extract_chunked(session, chunks, ["XM8_FIELD_0"], max_concurrency=concurrency, url=url)
+                    assert merged == {"XM8_FIELD_0": "ok"} and not failures
+                    row += f"{time.perf_counter() - start:>8.2f}"
+                print(row)
+    finally:
+        server.shutdown()
@@ -0,0 +1,73 @@
+"""Per-call cost of a bare requests.post against the pooled session.
+
+    python benchmarks/bench_llm_session.py [calls]
+
+Runs against a local stand-in for the chat-completions endpoint over plain
+HTTP, so the saving shown is the TCP connect and request setup only; against
+openrouter.ai every bare call also pays DNS and a TLS handshake on top.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import make_session  # noqa: E402
+
+CALLS = 500
+REPLY = json.dumps({"choices": [{"message": {"content": json.dumps({"XM8_INSURED_NAME": "New Zion Hill Baptist Church"})}}]}).encode()
+BODY = json.dumps({"model": "mistralai/mixtral-8x7b", "messages": [{"role": "user", "content": "x" * 6000}]}).encode()
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; without TCP_NODELAY (which
+    # real API servers set) a kept-alive connection stalls on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(REPLY)))
+        self.end_headers()
+        self.wfile.write(REPLY)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler=StandIn):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/v1/chat/completions"
+
+
+def timed_calls(post, url, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        res = post(url, data=BODY, headers={"Content-Type": "application/json"}, timeout=10)
+        res.raise_for_status()
+        res.json()
+    return (time.perf_counter() - start) / calls
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else CALLS
+    server, url = serve()
+    try:
+        bare = timed_calls(requests.post, url, calls)
+        with make_session() as session:
+            pooled = timed_calls(session.post, url, calls)
+    finally:
+        server.shutdown()
+    print(f"{calls} calls to a local stand-in server (us per call)")
+    print(f"{'bare requests.post':>20} {bare * 1e6:>10.0f}")
+    print(f"{'pooled session':>20} {pooled * 1e6:>10.0f}")
+    print(f"{'saving':>20} {(bare - pooled) * 1e6:>10.0f}")
@@ -0,0 +1,47 @@
+"""Per-page normalization against the old whole-string utf-8 round trip.
+
+    python benchmarks/bench_normalize.py [pages]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_cleanup import normalize_text  # noqa: E402
+
+REPEATS = 5
+
+PLAIN_PAGE = (
+    "EBERL CLAIMS SERVICE   PHOTO REPORT   \n"
+    "Insured:  New Zion Hill Baptist Church\n\n\n\n"
+    + "The roof covering shows wind creased shingles on the north slope and dam-\naged ridge caps.  \n" * 25
+)
+# what PyMuPDF hands back from typeset reports: ligatures, nbsp, soft hyphens
+TYPESET_PAGE = PLAIN_PAGE.replace("fi", "ﬁ").replace("  ", "  ").replace("ridge", "rid­ge")
+
+
+def old_round_trip(pages):
+    return "".join(pages).encode("utf-8", "ignore").decode("utf-8")
+
+
+def per_page(pages):
+    return "".join(normalize_text(page) for page in pages)
+
+
+def ms(func, pages):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func(pages)
+    return (time.perf_counter() - start) / REPEATS * 1000, len(result)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    for name, page in (("plain", PLAIN_PAGE), ("typeset", TYPESET_PAGE)):
+        pages = [page] * count
+        old_ms, old_chars = ms(old_round_trip, pages)
+        new_ms, new_chars = ms(per_page, pages)
+        print(f"{name} x{count} pages")
+        print(f"  utf-8 round trip  {old_ms:8.2f} ms  {old_chars:9d} chars")
+        print(f"  normalize_text    {new_ms:8.2f} ms  {new_chars:9d} chars")
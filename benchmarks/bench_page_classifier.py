@@ -0,0 +1,70 @@
+"""Per-page extraction cost with and without the photo-page classifier.
+
+    python benchmarks/bench_page_classifier.py [report.pdf ...]
+
+Without arguments a synthetic photo report is generated: a cover form,
+a narrative page and photo pages with a caption and a stamp over the photo.
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_extract import classify_page, page_text  # noqa: E402
+
+REPEATS = 5
+
+
+def synthetic_packet(photo_pages=60):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 1600, 1200), False)
+    pix.set_rect(pix.irect, (120, 110, 100))
+    photo = pix.tobytes("jpeg")
+
+    doc = fitz.open()
+    page = doc.new_page()
+    labels = ["Insured", "Date of Loss", "Date Inspected", "Property Address", "City", "State", "Zip", "Type of Loss", "Estimator", "Phone"]
+    for i, label in enumerate(labels):
+        page.insert_text((72, 90 + 40 * i), f"{label}:")
+        page.insert_text((260, 90 + 40 * i), "value")
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(72, 72, 540, 720), "The roof covering shows wind creased shingles on the north slope. " * 40)
+    for i in range(photo_pages):
+        page = doc.new_page()
+        page.insert_text((72, 50), "EBERL CLAIMS SERVICE - PHOTO REPORT")
+        page.insert_image(fitz.Rect(72, 80, 540, 431), stream=photo)
+        page.insert_text((90, 420), "10/21/2024 10:31 AM  GPS 29.76N 95.36W")
+        page.insert_text((72, 460), f"Photo {i + 1}: North elevation, wind damaged shingles")
+    return doc.tobytes()
+
+
+def per_page_us(doc, extract):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for page in doc:
+            extract(page)
+    return (time.perf_counter() - start) / REPEATS / doc.page_count * 1e6
+
+
+def bench(name, pdf_bytes):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        kinds = Counter(classify_page(page) for page in doc)
+        before = per_page_us(doc, lambda page: page.get_text())
+        after = per_page_us(doc, lambda page: page_text(page, photo_captions=True))
+        chars_before = sum(len(page.get_text()) for page in doc)
+        chars_after = sum(len(page_text(page, photo_captions=True)) for page in doc)
+        print(f"{name}: {doc.page_count} pages {dict(kinds)}")
+    print(f"  get_text()            {before:8.1f} us/page  {chars_before:8d} chars")
+    print(f"  classified + captions {after:8.1f} us/page  {chars_after:8d} chars")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, "rb") as f:
+                bench(os.path.basename(path), f.read())
+    else:
+        bench("synthetic photo report", synthetic_packet())
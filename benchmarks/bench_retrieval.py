@@ -0,0 +1,73 @@
+"""BM25 passage retrieval against sending the first N characters.
+
+    python benchmarks/bench_retrieval.py [pages]
+
+Builds a synthetic packet of inspection-note pages with each field's
+"Label: value" line planted on a random page, then reports index build and
+query time, how many fields find their planted line in the retrieved
+passages (recall) and how much text each approach sends.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fields import FIELD_LABELS  # noqa: E402
+from passage_index import DEFAULT_TOP_K, get_passage_index, retrieval_text  # noqa: E402
+
+PAGES = 400
+TEXT_CHARS = 6000
+GROUP_SIZE = 4
+WORDS = ("roof shingle slope north south ridge gutter flashing decking membrane interior ceiling stain water "
+         "wind hail granule loss bruising soffit fascia downspout elevation photo measurement damage").split()
+VALUES = {
+    "XM8_INSURED_NAME": "New Zion Hill Baptist Church",
+    "XM8_DATE_LOSS": "03/14/2024",
+    "XM8_DATE_INSPECTED": "10/21/2024",
+    "XM8_INSURED_P_STREET": "1410 Oak Grove Road",
+    "XM8_INSURED_P_ZIP": "35950",
+    "XM8_TOL_DESC": "Wind and hail",
+    "XM8_ESTIMATOR_NAME": "Steven Kujawski",
+    "XM8_ESTIMATOR_E_MAIL": "commercialclaims@eberls.com",
+    "XM8_ESTIMATOR_C_PHONE": "(800) 607-3604",
+}
+
+
+def packet(pages, rng):
+    texts = []
+    for page in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(30)]
+        texts.append([f"Photo {page + 1}"] + lines)
+    for name, value in VALUES.items():
+        texts[rng.randrange(pages)].insert(rng.randrange(1, 30), f"{FIELD_LABELS[name][0].title()}: {value}")
+    return [(0, page, "\n".join(lines) + "\n") for page, lines in enumerate(texts)]
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else PAGES
+    records = packet(pages, random.Random(7))
+    full_text = "".join(text for _, _, text in records)
+    names = list(VALUES)
+    groups = [names[i:i + GROUP_SIZE] for i in range(0, len(names), GROUP_SIZE)]
+
+    start = time.perf_counter()
+    index = get_passage_index(records)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    get_passage_index(records)
+    cached_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    texts = [retrieval_text(index, group, DEFAULT_TOP_K) for group in groups]
+    query_s = (time.perf_counter() - start) / len(names)
+    found = sum(VALUES[name] in text for group, text in zip(groups, texts) for name in group)
+    head_found = sum(value in full_text[:TEXT_CHARS] for value in VALUES.values())
+
+    print(f"{pages} pages, {len(full_text):,} characters, {len(index.passages)} passages")
+    print(f"index build {build_s * 1e3:.1f} ms, cached lookup {cached_s * 1e3:.1f} ms, {query_s * 1e3:.2f} ms per field")
+    print(f"{'approach':>24} {'chars sent':>12} {'fields found':>13}")
+    print(f"{'whole report':>24} {len(full_text):>12,} {len(names):>10}/{len(names)}")
+    print(f"{f'first {TEXT_CHARS} chars':>24} {TEXT_CHARS:>12,} {head_found:>10}/{len(names)}")
+    print(f"{f'top-{DEFAULT_TOP_K}, groups of {GROUP_SIZE}':>24} {sum(map(len, texts)):>12,} {found:>10}/{len(names)}")
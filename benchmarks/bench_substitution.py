@@ -0,0 +1,98 @@
+"""Placeholder substitution cost across template and field-set sizes.
+
+    python benchmarks/bench_substitution.py
+
+Text level: the old paragraphs x fields loop against the single regex pass,
+for 1k-50k paragraphs and 10-500 fields. Document level: fill_with_plan on
+generated .docx templates of the same paragraph counts, and with the parsed
+template pool warm against a fresh parse per fill.
+"""
+import os
+import sys
+import time
+from io import BytesIO
+
+from docx import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx_template import TreePool, fill_with_plan, get_fill_plan, substituter  # noqa: E402
+
+PARAGRAPHS = [1_000, 5_000, 10_000, 50_000]
+FIELDS = [10, 100, 500]
+
+
+def field_values(count):
+    return {f"XM8_FIELD_{i}": f"value {i}" for i in range(count)}
+
+
+def paragraph_texts(paragraphs, fields):
+    return [f"Item {i}: [XM8_FIELD_{i % fields}] noted on the north elevation, see photo {i}." for i in range(paragraphs)]
+
+
+def old_loop(texts, values):
+    out = []
+    for text in texts:
+        for key, val in values.items():
+            if f"[{key}]" in text:
+                text = text.replace(f"[{key}]", val)
+        out.append(text)
+    return out
+
+
+def single_pass(texts, values):
+    substitute = substituter(values)
+    return [substitute(text) for text in texts]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def template(paragraphs, fields):
+    doc = Document()
+    for text in paragraph_texts(paragraphs, fields):
+        doc.add_paragraph(text)
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+if __name__ == "__main__":
+    print("text level (ns per paragraph)")
+    print(f"{'paragraphs':>10} {'fields':>6} {'old loop':>10} {'one pass':>10}")
+    for paragraphs in PARAGRAPHS:
+        for fields in FIELDS:
+            texts = paragraph_texts(paragraphs, fields)
+            values = field_values(fields)
+            old_s, old = timed(old_loop, texts, values)
+            new_s, new = timed(single_pass, texts, values)
+            assert old == new
+            print(f"{paragraphs:>10} {fields:>6} {old_s / paragraphs * 1e9:>10.0f} {new_s / paragraphs * 1e9:>10.0f}")
+
+    print()
+    print("document level, fill_with_plan with a compiled plan (us per paragraph)")
+    print(f"{'paragraphs':>10} {'fields':>6} {'fill':>10}")
+    for paragraphs in PARAGRAPHS:
+        for fields in (FIELDS[0], FIELDS[-1]):
+            data = template(paragraphs, fields)
+            plan = get_fill_plan(data)
+            fill_s, _ = timed(fill_with_plan, data, plan, field_values(fields))
+            print(f"{paragraphs:>10} {fields:>6} {fill_s / paragraphs * 1e6:>10.1f}")
+
+    print()
+    print("template pool, fill_with_plan on a warm pool against a parse per fill (ms per fill)")
+    print(f"{'paragraphs':>10} {'parse':>10} {'clone':>10}")
+    for paragraphs in PARAGRAPHS:
+        data = template(paragraphs, FIELDS[0])
+        plan = get_fill_plan(data)
+        values = field_values(FIELDS[0])
+        cold = TreePool(0)
+        warm = TreePool()
+        fill_with_plan(data, plan, values, warm)
+        parse_s, parsed = timed(fill_with_plan, data, plan, values, cold)
+        clone_s, cloned = timed(fill_with_plan, data, plan, values, warm)
+        assert parsed.getvalue() == cloned.getvalue()
+        print(f"{paragraphs:>10} {parse_s * 1e3:>10.1f} {clone_s * 1e3:>10.1f}")
@@ -0,0 +1,104 @@
+from llm_client import (CHAT_COMPLETIONS_URL, DEFAULT_CONCURRENCY, DEFAULT_MODEL, DEFAULT_TIMEOUT, build_prompt, chat_body,
+                        field_groups, run_chats)
+from text_cleanup import CHARS_PER_TOKEN
+
+# mixtral-8x7b's window; the reserve covers the instructions, field list and answer
+DEFAULT_CONTEXT_TOKENS = 32768
+DEFAULT_RESERVE_TOKENS = 4096
+# answers that mean "not in this chunk"; they never win over a real value
+EMPTY_VALUES = {"", "n/a", "na", "none", "null", "unknown", "not found", "not provided", "not available", "not mentioned"}
+
+
+# === PAGE-ALIGNED CHUNKS ===
+def chunk_chars(context_tokens=DEFAULT_CONTEXT_TOKENS, reserve_tokens=DEFAULT_RESERVE_TOKENS):
+    return max(1, context_tokens - reserve_tokens) * CHARS_PER_TOKEN
+
+
+# a page longer than a whole chunk is cut at line breaks
+def split_page(text, limit):
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit) + 1 or limit
+        yield text[:cut]
+        text = text[cut:]
+    if text:
+        yield text
+
+
+# Whole pages are packed into chunks of at most limit characters, in
+# document order, so no chunk boundary falls inside a page.
+def page_chunks(records, limit):
+    chunks = []
+    current = []
+    size = 0
+    for _, _, text in records:
+        for piece in split_page(text, limit):
+            if current and size + len(piece) > limit:
+                chunks.append("".join(current))
+                current = []
+                size = 0
+            current.append(piece)
+            size += len(piece)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+# === MERGE ===
+# Per field, the value most chunks agree on wins (compared case- and
+# whitespace-insensitively), ties go to the earliest chunk, and empty
+# answers never count: a field no chunk found a value for is left out, so
+# its placeholder stays instead of "None" or "N/A". The result depends only
+# on the answers and their chunk order, never on which call finished first.
+# Also returns every field that got more than one distinct value.
+def is_empty(value):
+    return value is None or (isinstance(value, str) and value.strip().casefold() in EMPTY_VALUES)
+
+
+def value_key(value):
+    return " ".join(str(value).split()).casefold()
+
+
+def merge_fields(results):
+    votes = {}
+    for index, fields in enumerate(results):
+        for name, value in fields.items():
+            if is_empty(value):
+                continue
+            key = value_key(value)
+            candidates = votes.setdefault(name, {})
+            if key in candidates:
+                candidates[key][0] += 1
+            else:
+                candidates[key] = [1, index, value]
+
+    merged = {}
+    conflicts = {}
+    for name, candidates in votes.items():
+        merged[name] = min(candidates.values(), key=lambda vote: (-vote[0], vote[1]))[2]
+        if len(candidates) > 1:
+            conflicts[name] = [vote[2] for vote in sorted(candidates.values(), key=lambda vote: vote[1])]
+    return merged, conflicts
+
+
+# === MAP-REDUCE EXTRACTION ===
+# One request per chunk and field group, all through the concurrent client,
+# so wall time follows the number of chunks over max_concurrency rather
+# than the document length. Returns (merged fields, conflicts, failures).
+def chunk_bodies(chunks, placeholders, group_size=0, model=DEFAULT_MODEL):
+    groups = field_groups(placeholders, group_size)
+    part = (lambda index: (index, len(chunks))) if len(chunks) > 1 else (lambda index: None)
+    return [chat_body(build_prompt(chunk, group, part(index)), model) for index, chunk in enumerate(chunks) for group in groups]
+
+
+def extract_bodies(session, bodies, max_concurrency=DEFAULT_CONCURRENCY, url=CHAT_COMPLETIONS_URL, timeout=DEFAULT_TIMEOUT,
+                   cache=None):
+    results = run_chats(session, bodies, max_concurrency, url, timeout, cache)
+    failures = [result for result in results if isinstance(result, Exception)]
+    merged, conflicts = merge_fields([result for result in results if isinstance(result, dict)])
+    return merged, conflicts, failures
+
+
+def extract_chunked(session, chunks, placeholders, group_size=0, max_concurrency=DEFAULT_CONCURRENCY, model=DEFAULT_MODEL,
+                    url=CHAT_COMPLETIONS_URL, timeout=DEFAULT_TIMEOUT, cache=None):
+    bodies = chunk_bodies(chunks, placeholders, group_size, model)
+    return extract_bodies(session, bodies, max_concurrency, url, timeout, cache)
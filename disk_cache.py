@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+import tempfile
+
+DEFAULT_CACHE_ROOT = os.path.join(tempfile.gettempdir(), "eberl-cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+# === CONTENT KEYS ===
+# source is bytes or the path of a file, which is hashed in chunks
+def content_key(source, *parts):
+    if isinstance(source, str):
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    else:
+        digest = hashlib.sha256(source)
+    for part in parts:
+        digest.update(b"\0")
+        digest.update(json.dumps(part, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# === SIZE-BOUNDED LRU CACHE OF JSON VALUES ===
+# One file per key, sharded by the first two hex digits. File mtime is the
+# recency stamp: hits touch the file, eviction removes the oldest first.
+class DiskCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value).encode("utf-8")
+        # write then rename so other Streamlit workers never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self, target_bytes=None):
+        # trim to 90% so a full cache doesn't evict on every put
+        target = self.max_bytes * 0.9 if target_bytes is None else target_bytes
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(size for _, size, _ in entries)
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self._size = size
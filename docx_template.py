@@ -0,0 +1,312 @@
+import bisect
+import copy
+import os
+import re
+import struct
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from xml.etree.ElementTree import iterparse
+
+from lxml import etree
+
+from disk_cache import content_key
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_P = f"{{{W_NS}}}p"
+W_T = f"{{{W_NS}}}t"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+# [XM8_DATE_LOSS] anywhere in a paragraph, including "([XM8_TOL_DESC])" and "[XM8_DATE_LOSS],"
+PLACEHOLDER = re.compile(r"\[([A-Za-z][A-Za-z0-9_]*)\]")
+# parts of the package that hold document text: body (with its tables and
+# text boxes), page headers and footers, footnotes, endnotes and comments
+STORY_PART = re.compile(r"^word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$")
+PART_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def open_template(template):
+    if isinstance(template, (bytes, bytearray, memoryview)):
+        template = BytesIO(template)
+    return zipfile.ZipFile(template)
+
+
+def story_parts(zf):
+    return [name for name in zf.namelist() if STORY_PART.match(name)]
+
+
+# === PLACEHOLDER SCANNER ===
+# Streams one part with iterparse, never building the python-docx tree.
+# Yields (paragraph index, [(w:t ordinal, text), ...]) per paragraph, the
+# ordinal being the position of the w:t among all w:t in the part. Paragraph
+# text is gathered from its w:t runs so placeholders split across runs are
+# still found. Paragraphs can nest (text boxes sit inside a run), hence the
+# stack; finished paragraphs are cleared to keep memory flat.
+def iter_paragraphs(stream):
+    stack = []
+    paragraph = 0
+    ordinal = 0
+    for event, elem in iterparse(stream, events=("start", "end")):
+        if elem.tag == W_P:
+            if event == "start":
+                stack.append((paragraph, []))
+                paragraph += 1
+                continue
+            yield stack.pop()
+            elem.clear()
+        elif event == "end" and elem.tag == W_T:
+            if stack:
+                stack[-1][1].append((ordinal, elem.text or ""))
+            ordinal += 1
+
+
+# Story parts are independent, so they are inflated and compiled on a
+# thread pool; results come back in part order.
+def map_parts(func, items):
+    items = list(items)
+    if len(items) <= 1 or PART_WORKERS <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(PART_WORKERS, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+# === SUBSTITUTION ENGINE ===
+# One regex pass per text node resolves every placeholder through a dict
+# lookup, so the cost is linear in the text and independent of the number
+# of fields. Placeholders without a value are left as they are.
+def substituter(field_values):
+    values = {key: str(value) for key, value in field_values.items()}
+
+    def replace(match):
+        return values.get(match.group(1), match.group(0))
+
+    return lambda text: PLACEHOLDER.sub(replace, text)
+
+
+# === FILL PLAN ===
+# Everything a fill needs to know about a template, compiled once per template
+# hash: the placeholder names and, per story part, one entry per paragraph
+# holding placeholders: [w:t ordinals, their text lengths (the run
+# boundaries), [[name, start, end], ...] offsets into the joined text].
+# Plans are plain JSON so they can also live in a DiskCache.
+PLAN_VERSION = 1
+PLAN_MEMORY_SLOTS = 16
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def compile_part(stream):
+    entries = []
+    for _, nodes in iter_paragraphs(stream):
+        text = "".join(text for _, text in nodes)
+        occurrences = [[match.group(1), match.start(), match.end()] for match in PLACEHOLDER.finditer(text)]
+        if occurrences:
+            entries.append([[ordinal for ordinal, _ in nodes], [len(text) for _, text in nodes], occurrences])
+    return entries
+
+
+def compile_template(template):
+    with open_template(template) as zf:
+        def compile_one(part):
+            with zf.open(part) as stream:
+                return compile_part(stream)
+
+        parts = story_parts(zf)
+        compiled = map_parts(compile_one, parts)
+    plan_parts = {part: entries for part, entries in zip(parts, compiled) if entries}
+    names = dict.fromkeys(name for entries in plan_parts.values() for entry in entries for name, _, _ in entry[2])
+    return {"version": PLAN_VERSION, "placeholders": list(names), "parts": plan_parts}
+
+
+# Memory first, then the disk cache, then compile.
+def get_fill_plan(template_bytes, cache=None):
+    key = content_key(template_bytes, PLAN_VERSION)
+    with _plans_lock:
+        plan = _plans.get(key)
+    if plan is None and cache is not None:
+        plan = cache.get(key)
+    if plan is None:
+        plan = compile_template(template_bytes)
+        if cache is not None:
+            cache.put(key, plan)
+    with _plans_lock:
+        _plans[key] = plan
+        _plans.move_to_end(key)
+        while len(_plans) > PLAN_MEMORY_SLOTS:
+            _plans.popitem(last=False)
+    return plan
+
+
+# === FILL FROM A PLAN ===
+# Only the w:t nodes the plan lists are touched, nothing else is rescanned.
+# Placeholders that sit inside one node go through the substitution engine
+# node by node. A placeholder that Word split across runs is resolved on
+# the paragraph's virtual text: the value goes into the run where the
+# placeholder starts, the rest of the placeholder is cut from the runs it
+# spans, and every other run keeps its text and formatting.
+def _run_starts(lengths):
+    starts = []
+    total = 0
+    for length in lengths:
+        starts.append(total)
+        total += length
+    return starts
+
+
+def _within_nodes(lengths, occurrences):
+    starts = _run_starts(lengths)
+    return all(bisect.bisect_right(starts, start) == bisect.bisect_right(starts, end - 1) for _, start, end in occurrences)
+
+
+def _replace_across_runs(nodes, lengths, occurrences, values):
+    starts = _run_starts(lengths)
+    # right to left, so a run's start offset never moves under us
+    for name, start, end in reversed(occurrences):
+        if name not in values:
+            continue
+        first = bisect.bisect_right(starts, start) - 1
+        last = bisect.bisect_right(starts, end - 1) - 1
+        head = nodes[first].text or ""
+        tail = nodes[last].text or ""
+        if first == last:
+            nodes[first].text = head[:start - starts[first]] + values[name] + head[end - starts[first]:]
+        else:
+            nodes[first].text = head[:start - starts[first]] + values[name]
+            for node in nodes[first + 1:last]:
+                node.text = ""
+            nodes[last].text = tail[end - starts[last]:]
+            nodes[last].set(XML_SPACE, "preserve")
+        nodes[first].set(XML_SPACE, "preserve")
+
+
+def fill_tree(root, entries, field_values):
+    substitute = substituter(field_values)
+    values = {key: str(value) for key, value in field_values.items()}
+    nodes = list(root.iter(W_T))
+    for ordinals, lengths, occurrences in entries:
+        paragraph = [nodes[ordinal] for ordinal in ordinals]
+        if [len(node.text or "") for node in paragraph] != lengths:
+            raise ValueError("fill plan does not match template")
+        if _within_nodes(lengths, occurrences):
+            for node in paragraph:
+                if node.text and "[" in node.text:
+                    node.text = substitute(node.text)
+        else:
+            _replace_across_runs(paragraph, lengths, occurrences, values)
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+# === PARSED TEMPLATE POOL ===
+# Story parts are parsed once per template hash and deep-copied for every
+# fill, which skips inflating and parsing the XML again (a copy costs about
+# half a parse). Trees are charged at TREE_BYTES_PER_XML_BYTE
+# times their XML size, about what libxml2 takes, and the least recently
+# used are dropped once the pool passes max_bytes.
+TREE_POOL_MAX_BYTES = 256 * 1024 * 1024
+TREE_BYTES_PER_XML_BYTE = 4
+
+
+class TreePool:
+    def __init__(self, max_bytes=TREE_POOL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+    # load() returns the part's XML and is only called on a miss
+    def clone(self, key, part, load):
+        with self._lock:
+            entry = self._trees.get((key, part))
+            if entry is not None:
+                self._trees.move_to_end((key, part))
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            data = load()
+            entry = (etree.fromstring(data), len(data) * TREE_BYTES_PER_XML_BYTE)
+            self._add(key, part, entry)
+        return copy.deepcopy(entry[0])
+
+    def _add(self, key, part, entry):
+        if entry[1] > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._trees.pop((key, part), None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._trees[(key, part)] = entry
+            self.size += entry[1]
+            while self.size > self.max_bytes:
+                _, (_, size) = self._trees.popitem(last=False)
+                self.size -= size
+
+    def stats(self):
+        with self._lock:
+            return {"trees": len(self._trees), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+_trees = TreePool()
+
+
+# === STREAMING DOCX WRITER ===
+# Only the parts the plan lists are inflated, filled and deflated again.
+# Every other member (media, styles, fonts) is copied as its raw compressed
+# bytes straight from the template, never decompressed or recompressed.
+COPY_CHUNK = 1024 * 1024
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+
+def _copy_raw(zin, info, zout):
+    zin.fp.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(zin.fp.read(_LOCAL_HEADER.size))
+    zin.fp.seek(info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1])
+
+    out = copy.copy(info)
+    # sizes and CRC go in the local header, no trailing data descriptor
+    out.flag_bits &= ~0x08
+    out.header_offset = zout.fp.tell()
+    zout.fp.write(out.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(COPY_CHUNK, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"truncated member {info.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(out)
+    zout.NameToInfo[out.filename] = out
+    zout.start_dir = zout.fp.tell()
+
+
+# key is the template's content_key, pass it when filling the same template
+# many times so it is hashed once
+def write_filled(template, plan, field_values, target, trees=None, key=None):
+    trees = trees or _trees
+    key = key or content_key(template)
+    with open_template(template) as zin:
+        def fill(part):
+            root = trees.clone(key, part, lambda: zin.read(part))
+            return fill_tree(root, plan["parts"][part], field_values)
+
+        parts = list(plan["parts"])
+        filled = dict(zip(parts, map_parts(fill, parts)))
+        with zipfile.ZipFile(target, "w") as zout:
+            for info in zin.infolist():
+                if info.filename in filled:
+                    out = zipfile.ZipInfo(info.filename, info.date_time)
+                    out.external_attr = info.external_attr
+                    zout.writestr(out, filled[info.filename], compress_type=zipfile.ZIP_DEFLATED)
+                else:
+                    _copy_raw(zin, info, zout)
+
+
+def fill_with_plan(template, plan, field_values, trees=None, key=None):
+    output = BytesIO()
+    write_filled(template, plan, field_values, output, trees, key)
+    output.seek(0)
+    return output
@@ -1,75 +1,181 @@
-import fitz  # PyMuPDF
-import json
-import requests
+import io
 import os
-from io import BytesIO
-from docx import Document
+import tempfile
+import time
 import streamlit as st
 
+from batch_fill import read_records, record_format, render_batch, write_zip
+from chunked_extract import DEFAULT_CONTEXT_TOKENS, DEFAULT_RESERVE_TOKENS, chunk_bodies, chunk_chars, extract_bodies, page_chunks
+from disk_cache import DEFAULT_CACHE_ROOT, DiskCache
+from docx_template import TreePool, fill_with_plan, get_fill_plan
+from ingest import DEFAULT_MEMORY_CEILING, UploadSpool
+from layout_index import LayoutIndex
+from llm_client import (DEFAULT_CACHE_TTL, DEFAULT_CONCURRENCY, DEFAULT_KEEPALIVE_IDLE, DEFAULT_POOL_SIZE, ResponseCache,
+                        build_prompt, chat_body, field_groups, make_session)
+from passage_index import DEFAULT_TOP_K, PASSAGE_CHARS, get_passage_index, retrieval_text
+from pdf_extract import DEFAULT_WORKERS, SHARD_MIN_PAGES, iter_cached_pages, join_pages, take_pages
+from pipeline import PipelineContext
+from text_cleanup import approx_tokens, normalize_pages, strip_boilerplate
+
 # === SECURE API KEY ===
 OPENROUTER_API_KEY = st.secrets.get("OPENROUTER_API_KEY") or os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
     st.error("❌ OpenRouter API key not found. Add it in Streamlit → Settings → Secrets.")
     st.stop()
 
-# === PDF TEXT EXTRACTION ===
-def extract_pdf_text(uploaded_pdfs):
-    combined_text = ""
-    for file in uploaded_pdfs:
-        with fitz.open(stream=file.read(), filetype="pdf") as doc:
-            for page in doc:
-                combined_text += page.get_text()
-    return combined_text.encode("utf-8", "ignore").decode("utf-8")
+# === SETTINGS ===
+# Secrets first, then the environment. Only a missing (or empty env) value
+# falls back to the default, so false and 0 in secrets.toml are honoured;
+# TOML values are used as typed, env strings are converted.
+def get_setting(name, default):
+    value = st.secrets.get(name)
+    if value is None:
+        value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    if not isinstance(value, str):
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
 
-# === PLACEHOLDER EXTRACTION FROM DOCX ===
-def extract_placeholders(docx_file):
-    doc = Document(docx_file)
-    placeholders = set()
-    for para in doc.paragraphs:
-        for word in para.text.split():
-            if word.startswith("[") and word.endswith("]"):
-                placeholders.add(word.strip("[]"))
-    return list(placeholders)
+PDF_WORKERS = get_setting("PDF_WORKERS", DEFAULT_WORKERS)
+PDF_SHARD_MIN_PAGES = get_setting("PDF_SHARD_MIN_PAGES", SHARD_MIN_PAGES)
+CACHE_ROOT = get_setting("CACHE_ROOT", DEFAULT_CACHE_ROOT)
+PDF_CACHE_MAX_MB = get_setting("PDF_CACHE_MAX_MB", 512)
+# uploads beyond this many MB per session are spooled to disk, 0 spools all
+PDF_MEMORY_CEILING_MB = get_setting("PDF_MEMORY_CEILING_MB", DEFAULT_MEMORY_CEILING // (1024 * 1024))
+# photo pages contribute only their captions
+PDF_PHOTO_CAPTIONS = get_setting("PDF_PHOTO_CAPTIONS", True)
+# send the whole report in page-aligned chunks sized to the model's context window
+# (LLM_CONTEXT_TOKENS less LLM_RESERVE_TOKENS), otherwise only its first LLM_TEXT_CHARS characters
+LLM_CHUNKED = get_setting("LLM_CHUNKED", True)
+LLM_CONTEXT_TOKENS = get_setting("LLM_CONTEXT_TOKENS", DEFAULT_CONTEXT_TOKENS)
+LLM_RESERVE_TOKENS = get_setting("LLM_RESERVE_TOKENS", DEFAULT_RESERVE_TOKENS)
+LLM_TEXT_CHARS = get_setting("LLM_TEXT_CHARS", 6000)
+# instead, send each group of LLM_RETRIEVAL_GROUP_SIZE fields only the LLM_TOP_K best
+# matching passages (of about LLM_PASSAGE_CHARS) per field from a BM25 index of the report
+LLM_RETRIEVAL = get_setting("LLM_RETRIEVAL", True)
+LLM_TOP_K = get_setting("LLM_TOP_K", DEFAULT_TOP_K)
+LLM_PASSAGE_CHARS = get_setting("LLM_PASSAGE_CHARS", PASSAGE_CHARS)
+LLM_RETRIEVAL_GROUP_SIZE = get_setting("LLM_RETRIEVAL_GROUP_SIZE", 4)
+# in truncating mode only: stop reading pages once LLM_TEXT_CHARS are filled or every
+# placeholder has a candidate (chunked and retrieval modes always read the whole report)
+PDF_LAZY = get_setting("PDF_LAZY", True)
+# lines on at least this share of pages are treated as header/footer boilerplate
+BOILERPLATE_MIN_SHARE = get_setting("BOILERPLATE_MIN_SHARE", 0.5)
+# leading pages of each report scanned for "Label: value" pairs
+LAYOUT_MAX_PAGES = get_setting("LAYOUT_MAX_PAGES", 5)
+# parsed template parts kept in memory for reuse across fills
+TEMPLATE_POOL_MAX_MB = get_setting("TEMPLATE_POOL_MAX_MB", 256)
+# pooled connections to the LLM API, their TCP keep-alive idle time and the per-call timeout, in seconds
+LLM_POOL_SIZE = get_setting("LLM_POOL_SIZE", DEFAULT_POOL_SIZE)
+LLM_KEEPALIVE_S = get_setting("LLM_KEEPALIVE_S", DEFAULT_KEEPALIVE_IDLE)
+LLM_TIMEOUT_S = get_setting("LLM_TIMEOUT_S", 120)
+# LLM requests in flight at once (keep at or below LLM_POOL_SIZE) and fields per request, 0 = one request
+LLM_CONCURRENCY = get_setting("LLM_CONCURRENCY", DEFAULT_CONCURRENCY)
+LLM_GROUP_SIZE = get_setting("LLM_GROUP_SIZE", 0)
+# identical prompts are answered from disk for this many seconds, 0 turns the cache off
+LLM_CACHE_TTL_S = get_setting("LLM_CACHE_TTL_S", DEFAULT_CACHE_TTL)
+LLM_CACHE_MAX_MB = get_setting("LLM_CACHE_MAX_MB", 64)
 
-# === CALL LLM TO FILL PLACEHOLDERS ===
-def call_llm(pdf_text, placeholders):
-    prompt = f"""
-You are an insurance report assistant. From the PDF report text below, extract values for the following fields:
-
-{placeholders}
-
-Report:
-\"\"\"
-{pdf_text[:6000]}
-\"\"\"
-
-Return ONLY valid JSON like:
-{{
-  "XM8_INSURED_NAME": "New Zion Hill Baptist Church",
-  "XM8_DATE_INSPECTED": "2024-10-21",
-  ...
-}}
-"""
-    headers = {
+@st.cache_resource
+def get_pdf_cache():
+    return DiskCache(os.path.join(CACHE_ROOT, "pdf-text"), PDF_CACHE_MAX_MB * 1024 * 1024)
+
+@st.cache_resource
+def get_plan_cache():
+    return DiskCache(os.path.join(CACHE_ROOT, "fill-plans"), 64 * 1024 * 1024)
+
+@st.cache_resource
+def get_template_trees():
+    return TreePool(TEMPLATE_POOL_MAX_MB * 1024 * 1024)
+
+@st.cache_resource
+def get_llm_session():
+    return make_session(LLM_POOL_SIZE, LLM_KEEPALIVE_S, {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
         "HTTP-Referer": "https://your-app-name.streamlit.app"  # Optional
-    }
+    })
 
-    body = {
-        "model": "mistralai/mixtral-8x7b",
-        "messages": [{"role": "user", "content": prompt}]
-    }
+@st.cache_resource
+def get_index_cache():
+    return DiskCache(os.path.join(CACHE_ROOT, "passage-index"), 128 * 1024 * 1024)
 
-    try:
-        encoded_body = json.dumps(body, ensure_ascii=False).encode("utf-8")
-        res = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, data=encoded_body)
-        res.raise_for_status()
-        content = res.json()["choices"][0]["message"]["content"]
-        return json.loads(content)
-    except Exception as e:
-        st.error(f"❌ LLM call failed: {e}")
-        return {}
+@st.cache_resource
+def get_llm_cache():
+    if not LLM_CACHE_TTL_S:
+        return None
+    return ResponseCache(DiskCache(os.path.join(CACHE_ROOT, "llm-responses"), LLM_CACHE_MAX_MB * 1024 * 1024), LLM_CACHE_TTL_S)
+
+# === PDF TEXT EXTRACTION ===
+# Returns the report's page records for the LLM, the placeholders that could be
+# filled straight from label/value pairs in the report layout, and the
+# spool and boilerplate removal stats. Each PDF is read through the context one at a
+# time; those the spool writes to disk are released straight away, so only
+# the uploads under the memory ceiling stay in memory.
+def extract_pdf_text(context, pdf_files, placeholders=()):
+    stats = {}
+    with UploadSpool(PDF_MEMORY_CEILING_MB * 1024 * 1024) as spool:
+        sources = []
+        for file in pdf_files:
+            source = spool.add(context.read(file))
+            if isinstance(source, str):
+                context.release(file)
+            sources.append(source)
+        stats["in_memory"] = spool.in_memory
+        stats["spooled"] = spool.spooled
+        layout_values = LayoutIndex.from_sources(sources, LAYOUT_MAX_PAGES, get_pdf_cache()).field_values(placeholders)
+        pages = iter_cached_pages(
+            sources,
+            get_pdf_cache(),
+            max_workers=PDF_WORKERS,
+            shard_min_pages=PDF_SHARD_MIN_PAGES,
+            photo_captions=PDF_PHOTO_CAPTIONS,
+        )
+        pages = strip_boilerplate(normalize_pages(pages), BOILERPLATE_MIN_SHARE, stats=stats)
+        if PDF_LAZY and not (LLM_RETRIEVAL or LLM_CHUNKED):
+            pending = [name for name in placeholders if name not in layout_values]
+            pages = take_pages(pages, pending, LLM_TEXT_CHARS)
+        return list(pages), layout_values, stats
+
+# === PLACEHOLDER EXTRACTION FROM DOCX ===
+def extract_placeholders(template):
+    return get_fill_plan(template.data, get_plan_cache())["placeholders"]
+
+# === CALL LLM TO FILL PLACEHOLDERS ===
+# Retrieval: each field group gets only its best matching passages.
+# Chunked: every chunk is asked for every field group (0 = all fields in one
+# request). Either way all requests run concurrently and the answers are
+# merged per field; a failed request is reported and the rest are kept.
+def llm_bodies(pages, placeholders):
+    budget = chunk_chars(LLM_CONTEXT_TOKENS, LLM_RESERVE_TOKENS)
+    if LLM_RETRIEVAL:
+        index = get_passage_index(pages, LLM_PASSAGE_CHARS, get_index_cache())
+        groups = field_groups(placeholders, LLM_GROUP_SIZE or LLM_RETRIEVAL_GROUP_SIZE)
+        return [chat_body(build_prompt(retrieval_text(index, group, LLM_TOP_K, budget), group)) for group in groups]
+    if LLM_CHUNKED:
+        chunks = page_chunks(pages, budget)
+    else:
+        chunks = [join_pages(pages)[:LLM_TEXT_CHARS]]
+    return chunk_bodies(chunks, placeholders, LLM_GROUP_SIZE)
+
+def call_llm(pages, placeholders):
+    bodies = llm_bodies(pages, placeholders)
+    field_values, conflicts, failures = extract_bodies(
+        get_llm_session(),
+        bodies,
+        LLM_CONCURRENCY,
+        timeout=LLM_TIMEOUT_S,
+        cache=get_llm_cache(),
+    )
+    for failure in failures:
+        st.error(f"❌ LLM call failed: {failure}")
+    report_chars = sum(len(text) for _, _, text in pages)
+    prompt_chars = sum(len(body["messages"][0]["content"]) for body in bodies)
+    st.caption(f"Sent {len(bodies)} requests, {prompt_chars:,} prompt characters (~{approx_tokens(prompt_chars):,} tokens) "
+               f"for a {report_chars:,}-character report; {len(conflicts)} fields had conflicting answers.")
+    return field_values
 
 # === MOCK FALLBACK DATA ===
 def mock_data():
@@ -89,16 +195,9 @@ def mock_data():
     }
 
 # === FILL DOCX TEMPLATE ===
-def fill_template(docx_file, field_values):
-    doc = Document(docx_file)
-    for para in doc.paragraphs:
-        for key, val in field_values.items():
-            if f"[{key}]" in para.text:
-                para.text = para.text.replace(f"[{key}]", val)
-    output = BytesIO()
-    doc.save(output)
-    output.seek(0)
-    return output
+def fill_template(template, field_values):
+    plan = get_fill_plan(template.data, get_plan_cache())
+    return fill_with_plan(template.data, plan, field_values, get_template_trees())
 
 # === STREAMLIT APP ===
 st.set_page_config("Eberl Report Auto-Filler", page_icon="📄")
@@ -112,22 +211,36 @@ if st.button("Process"):
         st.error("Please upload both a template and at least one report.")
         st.stop()
 
-    with st.spinner("🔍 Extracting text..."):
-        pdf_text = extract_pdf_text(pdf_files)
+    # every stage below works from these buffers, each upload is read once
+    context = PipelineContext()
+    template = context.read(template_file)
 
     with st.spinner("🔎 Finding placeholders..."):
-        placeholders = extract_placeholders(template_file)
+        placeholders = extract_placeholders(template)
 
-    with st.spinner("🤖 Calling LLM..."):
-        field_values = call_llm(pdf_text, placeholders)
-        if not field_values:
-            st.warning("⚠️ Using mock data due to LLM issue.")
-            field_values = mock_data()
+    with st.spinner("🔍 Extracting text..."):
+        pages, layout_values, stats = extract_pdf_text(context, pdf_files, placeholders)
+    st.caption(f"Input: {context.files_read} files, {context.input_bytes:,} bytes "
+               f"({stats['in_memory']:,} kept in memory, {stats['spooled']:,} spooled to disk).")
+    saved = stats["chars_in"] - stats["chars_out"]
+    st.caption(f"Removed {stats['lines_removed']} repeated header/footer lines: {saved:,} characters (~{approx_tokens(saved):,} tokens).")
+
+    missing = [name for name in placeholders if name not in layout_values]
+    field_values = {}
+    if missing:
+        with st.spinner("🤖 Calling LLM..."):
+            field_values = call_llm(pages, missing)
+            if not field_values:
+                st.warning("⚠️ Using mock data due to LLM issue.")
+                field_values = mock_data()
+    field_values.update(layout_values)
 
     st.success("✅ Data extracted!")
 
     with st.spinner("📝 Filling template..."):
-        filled_doc = fill_template(template_file, field_values)
+        filled_doc = fill_template(template, field_values)
+    trees = get_template_trees().stats()
+    st.caption(f"Template pool: {trees['hits']} hits, {trees['misses']} misses, {trees['bytes'] / 1e6:.0f} MB.")
 
     st.download_button(
         label="📥 Download Filled Report",
@@ -135,3 +248,42 @@ if st.button("Process"):
         file_name="filled_eberl_report.docx",
         mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     )
+
+# === BATCH FILL ===
+# Many claims, one template: reports are rendered on the worker pool and
+# streamed into a zip on disk one at a time, then served from that file.
+st.divider()
+st.subheader("📦 Batch Fill")
+records_file = st.file_uploader("Upload Claim Records (.jsonl / .csv)", type=["jsonl", "csv"])
+name_field = st.text_input("Name reports by field (optional)", placeholder="XM8_CLAIM_NUMBER")
+
+if st.button("Fill Batch"):
+    if not template_file or not records_file:
+        st.error("Please upload both a template and a records file.")
+        st.stop()
+
+    context = PipelineContext()
+    template = context.read(template_file)
+    records_buffer = context.read(records_file)
+    records_text = io.StringIO(records_buffer.data.decode("utf-8-sig"), newline="")
+    records = list(read_records(records_text, record_format(records_buffer.name)))
+
+    with tempfile.TemporaryDirectory(prefix="eberl-batch-") as workdir:
+        template_path = os.path.join(workdir, "template.docx")
+        with open(template_path, "wb") as f:
+            f.write(template.view)
+        archive_path = os.path.join(workdir, "filled_eberl_reports.zip")
+
+        with st.spinner(f"📝 Filling {len(records)} reports..."):
+            start = time.perf_counter()
+            count = write_zip(render_batch(template_path, records, PDF_WORKERS), records, archive_path, name_field or None)
+            elapsed = time.perf_counter() - start
+
+        st.success(f"✅ {count} reports in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} documents/second)")
+        with open(archive_path, "rb") as archive:
+            st.download_button(
+                label="📥 Download Filled Reports (.zip)",
+                data=archive,
+                file_name="filled_eberl_reports.zip",
+                mime="application/zip"
+            )
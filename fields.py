@@ -0,0 +1,45 @@
+import re
+from functools import lru_cache
+
+# === FIELD LABELS ===
+# How the photo reports label each XM8 placeholder. Placeholders that are
+# not listed fall back to the words of their own name (XM8_INSURED_NAME ->
+# "insured name"); an empty list means the value never comes from a report.
+FIELD_LABELS = {
+    "XM8_INSURED_NAME": ["insured name", "named insured", "insured", "policyholder"],
+    "XM8_DATE_LOSS": ["date of loss", "loss date", "dol"],
+    "XM8_DATE_INSPECTED": ["date inspected", "inspection date", "date of inspection"],
+    "XM8_INSURED_P_STREET": ["property address", "loss location", "loss address", "street"],
+    "XM8_INSURED_P_CITY": ["city"],
+    "XM8_INSURED_P_STATE": ["state"],
+    "XM8_INSURED_P_ZIP": ["zip code", "zip", "postal code"],
+    "XM8_TOL_DESC": ["type of loss", "cause of loss", "peril"],
+    "XM8_ESTIMATOR_NAME": ["estimator", "adjuster", "inspector"],
+    "XM8_ESTIMATOR_E_MAIL": ["e-mail", "email"],
+    "XM8_ESTIMATOR_C_PHONE": ["cell phone", "phone", "telephone"],
+    "XM8_DATE_CURRENT": [],
+}
+
+
+def field_labels(name):
+    if name in FIELD_LABELS:
+        return FIELD_LABELS[name]
+    words = [word for word in name.split("_") if len(word) > 1 and word != "XM8"]
+    return [" ".join(words).lower()] if words else []
+
+
+# === CANDIDATE VALUES ===
+# A field has a candidate value once one of its labels is followed by text,
+# optionally after a colon. Returns None for fields with no labels.
+@lru_cache(maxsize=None)
+def label_pattern(name):
+    labels = field_labels(name)
+    if not labels:
+        return None
+    alternatives = "|".join(r"\s+".join(map(re.escape, label.split())) for label in labels)
+    return re.compile(rf"\b(?:{alternatives})\b\s*[:#-]?\s*\S", re.IGNORECASE)
+
+
+def has_candidate(name, text):
+    pattern = label_pattern(name)
+    return pattern is None or pattern.search(text) is not None
@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+
+DEFAULT_MEMORY_CEILING = 256 * 1024 * 1024
+
+
+# === SPOOL UPLOADS TO DISK ===
+# Uploads are kept as bytes until the session's memory ceiling is reached,
+# later ones are written to a temp directory and handed on as
+# paths so fitz opens them by filename. A ceiling of 0 spools everything.
+class UploadSpool:
+    def __init__(self, memory_ceiling=DEFAULT_MEMORY_CEILING, directory=None):
+        self.memory_ceiling = memory_ceiling
+        self.directory = tempfile.mkdtemp(prefix="eberl-spool-", dir=directory)
+        self.in_memory = 0
+        self.spooled = 0
+
+    # upload is a pipeline.UploadBuffer; its bytes are handed on as-is
+    def add(self, upload):
+        size = upload.size
+        if self.in_memory + size <= self.memory_ceiling:
+            self.in_memory += size
+            return upload.data
+
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(upload.view)
+        self.spooled += size
+        return path
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,153 @@
+import re
+
+import numpy as np
+
+from disk_cache import content_key
+from fields import FIELD_LABELS, field_labels
+from pdf_extract import EXTRACTOR_VERSION, open_source
+from text_cleanup import normalize_text
+
+INLINE_LABEL = re.compile(r"^\s*([A-Za-z][A-Za-z0-9 #/&().'-]{1,40}?)\s*:\s*(\S.*?)\s*$")
+
+
+def normalize_label(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+KNOWN_LABELS = {normalize_label(label) for labels in FIELD_LABELS.values() for label in labels}
+
+
+# One source's text lines as plain lists (JSON-ready for the cache): texts,
+# their bboxes and page numbers, and the (label, value) row pairs split out
+# of inline "Label: value" lines.
+def source_lines(source, max_pages=None):
+    texts = []
+    boxes = []
+    pages = []
+    inline = []
+    page_count = 0
+    with open_source(source) as doc:
+        for page in doc:
+            if max_pages is not None and page.number >= max_pages:
+                break
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", ()):
+                    text = normalize_text("".join(span["text"] for span in line["spans"])).strip()
+                    if not text:
+                        continue
+                    bbox = list(line["bbox"])
+                    match = INLINE_LABEL.match(text)
+                    if match and not match.group(2).endswith(":"):
+                        inline.append((len(texts), len(texts) + 1))
+                        texts.extend(match.groups())
+                        boxes.extend((bbox, bbox))
+                        pages.extend((page.number, page.number))
+                    else:
+                        texts.append(text)
+                        boxes.append(bbox)
+                        pages.append(page.number)
+            page_count += 1
+    return {"texts": texts, "boxes": boxes, "pages": pages, "inline": inline, "page_count": page_count}
+
+
+# === LAYOUT KEY/VALUE INDEX ===
+# Text lines are kept as parallel arrays (a list of strings plus numpy
+# x0/y0/x1/y1 and page arrays) rather than a dict per span. Each label line
+# is paired with the value to its right on the same row, else the nearest
+# line below it, and the pairs land in a dict keyed by normalized label.
+class LayoutIndex:
+    def __init__(self, texts, boxes, pages, inline=()):
+        self.texts = texts
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.pages = np.asarray(pages, dtype=np.int32)
+        self.pairs = {}
+        # inline "Label: value" lines are already paired, first occurrence
+        # wins; both halves are taken, neither is a value for another label
+        taken = set()
+        for label_row, value_row in inline:
+            self.pairs.setdefault(normalize_label(texts[label_row]), value_row)
+            taken.update((label_row, value_row))
+        self._pair_by_position(taken)
+
+    # With a DiskCache each source's lines are cached under its content hash,
+    # so a warm run never opens the PDF.
+    @classmethod
+    def from_sources(cls, sources, max_pages=None, cache=None):
+        texts = []
+        boxes = []
+        pages = []
+        inline = []
+        page_id = 0
+        for source in sources:
+            key = content_key(source, EXTRACTOR_VERSION, "layout", max_pages) if cache is not None else None
+            lines = cache.get(key) if key else None
+            if lines is None:
+                lines = source_lines(source, max_pages)
+                if key:
+                    cache.put(key, lines)
+            offset = len(texts)
+            texts.extend(lines["texts"])
+            boxes.extend(lines["boxes"])
+            pages.extend(page_id + page for page in lines["pages"])
+            inline.extend((offset + label_row, offset + value_row) for label_row, value_row in lines["inline"])
+            page_id += lines["page_count"]
+        return cls(texts, boxes, pages, inline)
+
+    def _is_label(self, row):
+        text = self.texts[row]
+        return text.endswith(":") or normalize_label(text) in KNOWN_LABELS
+
+    def _pair_by_position(self, taken=()):
+        if not self.texts:
+            return
+        x0, y0, x1, y1 = self.boxes.T
+        center = (y0 + y1) / 2
+        height = np.maximum(y1 - y0, 1)
+        labels = np.fromiter((self._is_label(row) for row in range(len(self.texts))), dtype=bool, count=len(self.texts))
+        paired = np.zeros(len(self.texts), dtype=bool)
+        paired[list(taken)] = True
+
+        # rows are appended page by page, so each page is one contiguous slice
+        bounds = np.flatnonzero(np.diff(self.pages)) + 1
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(self.texts)]):
+            page_rows = np.arange(start, stop)
+            candidates = page_rows[~labels[start:stop] & ~paired[start:stop]]
+            for row in page_rows[labels[start:stop] & ~paired[start:stop]]:
+                key = normalize_label(self.texts[row])
+                if not key or key in self.pairs or not len(candidates):
+                    continue
+                # right-hand value: same row, starts after the label ends
+                right = candidates[(np.abs(center[candidates] - center[row]) <= height[row] / 2) & (x0[candidates] >= x1[row] - 1)]
+                if len(right):
+                    self.pairs[key] = int(right[np.argmin(x0[right])])
+                    continue
+                # value below: overlaps the label column, its centre below the
+                # label's bottom edge and within two line heights of it (line
+                # boxes of single-spaced text overlap by a point or two)
+                below = candidates[
+                    (center[candidates] > y1[row])
+                    & (center[candidates] - y1[row] <= 2 * height[row])
+                    & (x0[candidates] < x1[row])
+                    & (x1[candidates] > x0[row])
+                ]
+                if len(below):
+                    self.pairs[key] = int(below[np.argmin(center[below])])
+
+    def get(self, label):
+        row = self.pairs.get(normalize_label(label))
+        return None if row is None else self.texts[row]
+
+    def field_value(self, name):
+        for label in field_labels(name):
+            value = self.get(label)
+            if value:
+                return value
+        return None
+
+    def field_values(self, placeholders):
+        values = {}
+        for name in placeholders:
+            value = self.field_value(name)
+            if value:
+                values[name] = value
+        return values
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from disk_cache import content_key
+
+CHAT_COMPLETIONS_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_MODEL = "mistralai/mixtral-8x7b"
+DEFAULT_TIMEOUT = 120
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONCURRENCY = 8
+# seconds a pooled connection may sit idle before TCP keep-alive probes start
+DEFAULT_KEEPALIVE_IDLE = 60
+RESPONSE_CACHE_VERSION = 1
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+
+
+# === POOLED HTTP SESSION ===
+# One session per process: connections to the API host are kept open and
+# reused, so only the first call pays for DNS, TCP and TLS. TCP keep-alive
+# probes stop idle pooled connections being dropped silently by NAT and
+# load balancers between calls.
+def keepalive_options(idle):
+    options = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    if idle and hasattr(socket, "TCP_KEEPIDLE"):
+        options += [
+            (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle),
+            (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, idle // 4)),
+            (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4),
+        ]
+    return options
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    def __init__(self, keepalive_idle=DEFAULT_KEEPALIVE_IDLE, **kwargs):
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = keepalive_options(self.keepalive_idle)
+        super().init_poolmanager(*args, **kwargs)
+
+
+# pool_size is the number of connections kept per host, i.e. how many calls
+# can be in flight at once without opening a throwaway connection
+def make_session(pool_size=DEFAULT_POOL_SIZE, keepalive_idle=DEFAULT_KEEPALIVE_IDLE, headers=None):
+    session = requests.Session()
+    adapter = KeepAliveAdapter(keepalive_idle, pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers or {})
+    return session
+
+
+# === PROMPT ===
+# part is (index, count) when the report is sent in several chunks
+def build_prompt(pdf_text, placeholders, part=None):
+    report = "Report:"
+    if part:
+        report = f"Report (part {part[0] + 1} of {part[1]}, use null for fields this part does not mention):"
+    return f"""
+You are an insurance report assistant. From the PDF report text below, extract values for the following fields:
+
+{placeholders}
+
+{report}
+\"\"\"
+{pdf_text}
+\"\"\"
+
+Return ONLY valid JSON like:
+{{
+  "XM8_INSURED_NAME": "New Zion Hill Baptist Church",
+  "XM8_DATE_INSPECTED": "2024-10-21",
+  ...
+}}
+"""
+
+
+def chat_body(prompt, model=DEFAULT_MODEL):
+    return {"model": model, "messages": [{"role": "user", "content": prompt}]}
+
+
+# size 0 keeps every field in one request
+def field_groups(placeholders, size=0):
+    placeholders = list(placeholders)
+    if not size:
+        return [placeholders] if placeholders else []
+    return [placeholders[i:i + size] for i in range(0, len(placeholders), size)]
+
+
+# === RESPONSE CACHE ===
+# Parsed field dicts on disk, keyed by a hash of the endpoint and the whole
+# request body (model, messages and any decoding parameters), so the same
+# prompt is only paid for once. Entries carry their creation time and expire
+# after ttl seconds; the DiskCache underneath bounds the total size, and its
+# write-then-rename keeps it safe for several worker processes at once.
+class ResponseCache:
+    def __init__(self, cache, ttl=DEFAULT_CACHE_TTL):
+        self.cache = cache
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, body, url):
+        return content_key(json.dumps(body, sort_keys=True).encode("utf-8"), url, RESPONSE_CACHE_VERSION)
+
+    def get(self, body, url=CHAT_COMPLETIONS_URL):
+        entry = self.cache.get(self.key(body, url))
+        if entry is None or time.time() - entry["created"] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["fields"]
+
+    def put(self, body, url, fields):
+        self.cache.put(self.key(body, url), {"created": time.time(), "fields": fields})
+
+
+# One blocking chat-completions call, returning the field dict the model
+# answered with; a cache hit returns without touching the network. HTTP and
+# JSON errors propagate to the caller and are never cached.
+def post_chat(session, body, url=CHAT_COMPLETIONS_URL, timeout=DEFAULT_TIMEOUT, cache=None):
+    if cache is not None:
+        fields = cache.get(body, url)
+        if fields is not None:
+            return fields
+    encoded_body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    res = session.post(url, headers={"Content-Type": "application/json"}, data=encoded_body, timeout=timeout)
+    res.raise_for_status()
+    content = res.json()["choices"][0]["message"]["content"]
+    fields = json.loads(content)
+    if cache is not None:
+        cache.put(body, url, fields)
+    return fields
+
+
+# === CONCURRENT REQUESTS ===
+# Many calls at once (field groups, text chunks, claims) over the pooled
+# session: asyncio schedules them and at most max_concurrency are in flight,
+# each on its own pooled connection. Results come back in request order,
+# a failed call as its exception, so one bad answer never sinks the rest.
+async def gather_chats(session, bodies, max_concurrency=DEFAULT_CONCURRENCY, url=CHAT_COMPLETIONS_URL, timeout=DEFAULT_TIMEOUT,
+                       cache=None):
+    bodies = list(bodies)
+    if not bodies:
+        return []
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(bodies)))) as executor:
+        calls = [loop.run_in_executor(executor, post_chat, session, body, url, timeout, cache) for body in bodies]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+
+# for callers without a running event loop (the Streamlit script, CLIs)
+def run_chats(session, bodies, max_concurrency=DEFAULT_CONCURRENCY, url=CHAT_COMPLETIONS_URL, timeout=DEFAULT_TIMEOUT,
+              cache=None):
+    return asyncio.run(gather_chats(session, bodies, max_concurrency, url, timeout, cache))
@@ -0,0 +1,149 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from chunked_extract import page_chunks
+from disk_cache import content_key
+from fields import field_labels
+
+TOKEN = re.compile(r"[a-z0-9]+")
+PASSAGE_CHARS = 1500
+DEFAULT_TOP_K = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+INDEX_VERSION = 1
+INDEX_MEMORY_SLOTS = 8
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+# Label synonyms plus the words of the placeholder name, so a field is
+# found both by how the reports label it and by what it is called. Fields
+# that never come from a report have no query.
+def field_query(name):
+    labels = field_labels(name)
+    if not labels:
+        return []
+    words = [word.lower() for word in name.split("_") if len(word) > 1 and word != "XM8"]
+    return tokenize(" ".join(labels)) + words
+
+
+# === BM25 PASSAGE INDEX ===
+# Passages are page-aligned windows of the report. Postings are flat numpy
+# arrays in term-major (CSC) order: term t's postings are
+# passages[starts[t]:starts[t + 1]], with their BM25 weights precomputed in
+# the same slice of weights, so scoring a query is one slice-and-add per
+# query term and no dense term x passage matrix is ever built.
+class PassageIndex:
+    def __init__(self, passages, terms, starts, postings, weights):
+        self.passages = passages
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.postings = np.asarray(postings, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+
+    @classmethod
+    def build(cls, passages, k1=BM25_K1, b=BM25_B):
+        vocabulary = {}
+        rows = []
+        cols = []
+        counts = []
+        lengths = np.zeros(len(passages), dtype=np.float32)
+        for row, text in enumerate(passages):
+            ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text)), dtype=np.int32)
+            lengths[row] = len(ids)
+            term_ids, tf = np.unique(ids, return_counts=True)
+            rows.append(np.full(len(term_ids), row, dtype=np.int32))
+            cols.append(term_ids)
+            counts.append(tf)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int32)
+        tf = np.concatenate(counts).astype(np.float32) if counts else np.zeros(0, dtype=np.float32)
+
+        order = np.lexsort((rows, cols))
+        rows, cols, tf = rows[order], cols[order], tf[order]
+        df = np.bincount(cols, minlength=len(vocabulary))
+        starts = np.concatenate(([0], np.cumsum(df)))
+        idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        average = float(lengths.mean()) if len(passages) else 0.0
+        norm = k1 * (1 - b + b * lengths[rows] / (average or 1.0))
+        weights = idf[cols] * tf * (k1 + 1) / (tf + norm)
+        return cls(passages, list(vocabulary), starts, rows, weights)
+
+    def scores(self, tokens):
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for term in set(tokens):
+            t = self.vocabulary.get(term)
+            if t is not None:
+                start, stop = self.starts[t], self.starts[t + 1]
+                scores[self.postings[start:stop]] += self.weights[start:stop]
+        return scores
+
+    # best first, ties by position; passages without any query term are never returned
+    def top_k(self, tokens, k=DEFAULT_TOP_K):
+        scores = self.scores(tokens)
+        ranked = np.lexsort((np.arange(len(scores)), -scores))[:k]
+        return [int(i) for i in ranked if scores[i] > 0]
+
+    # The top-k passages of every field in the group, best first, trimmed to
+    # char_budget and then put back in document order so the prompt reads
+    # like the report. With no match at all the report's opening is sent.
+    def passages_for(self, names, k=DEFAULT_TOP_K, char_budget=None):
+        hits = [self.top_k(field_query(name), k) for name in names]
+        ranked = []
+        for rank in range(k):
+            for field_hits in hits:
+                if rank < len(field_hits) and field_hits[rank] not in ranked:
+                    ranked.append(field_hits[rank])
+        if not ranked and self.passages:
+            ranked = [0]
+        chosen = []
+        used = 0
+        for i in ranked:
+            if char_budget and chosen and used + len(self.passages[i]) > char_budget:
+                break
+            chosen.append(i)
+            used += len(self.passages[i])
+        return sorted(chosen)
+
+    def to_json(self):
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        return {"version": INDEX_VERSION, "terms": terms, "starts": self.starts.tolist(),
+                "postings": self.postings.tolist(), "weights": self.weights.tolist()}
+
+
+# === INDEX CACHE ===
+# One index per document: keyed by the hash of the report's passages, kept
+# in a small memory LRU and, when a DiskCache is given, on disk for other
+# worker processes. Memory first, then disk, then build.
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_passage_index(records, passage_chars=PASSAGE_CHARS, cache=None):
+    passages = page_chunks(records, passage_chars)
+    key = content_key("\0".join(passages).encode("utf-8", "surrogatepass"), passage_chars, BM25_K1, BM25_B, INDEX_VERSION)
+    with _indexes_lock:
+        index = _indexes.get(key)
+    if index is None and cache is not None:
+        stored = cache.get(key)
+        if stored is not None:
+            index = PassageIndex(passages, stored["terms"], stored["starts"], stored["postings"], stored["weights"])
+    if index is None:
+        index = PassageIndex.build(passages)
+        if cache is not None:
+            cache.put(key, index.to_json())
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > INDEX_MEMORY_SLOTS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def retrieval_text(index, names, k=DEFAULT_TOP_K, char_budget=None):
+    return "\n".join(index.passages[i] for i in index.passages_for(names, k, char_budget))
@@ -0,0 +1,284 @@
+import os
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import fitz  # PyMuPDF
+
+from disk_cache import content_key
+from fields import has_candidate
+
+# bump when extracted text changes so cached pages are not reused
+EXTRACTOR_VERSION = 1
+DEFAULT_WORKERS = os.cpu_count() or 1
+# documents shorter than this stay on one worker, pool overhead would dominate
+SHARD_MIN_PAGES = 64
+# longer ones are cut into this many shards per worker, so a consumer that
+# stops early leaves most of them unsubmitted, but never into shards shorter
+# than MIN_SHARD_PAGES, each shard opens the document again
+SHARDS_PER_WORKER = 4
+MIN_SHARD_PAGES = 16
+
+# === WORKER POOL ===
+# Workers live in this module (not the Streamlit script) so they can be
+# imported by the child processes. Pools are kept for the life of the
+# server process, Streamlit reruns reuse them instead of paying spawn cost.
+# There is one pool per worker count, created under a lock: sessions asking
+# for different counts each get their own pool, and no pool is ever shut
+# down under a session still extracting on it (concurrent.futures stops
+# them at interpreter exit).
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(max_workers=None):
+    workers = max(1, max_workers or DEFAULT_WORKERS)
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn, not fork: the Streamlit server is multi-threaded
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+# === PAGE RANGE SHARDS ===
+def page_ranges(page_count, shards):
+    shards = max(1, min(shards, page_count))
+    step, extra = divmod(page_count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        stop = start + step + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+# === PAGE CLASSIFIER ===
+# A page whose resources list no XObject cannot place a photo, so it is
+# plain text and costs one ordinary get_text(); the check is a dictionary
+# lookup, the content stream is not parsed. Only pages that may be photo
+# pages take the block pass that also lists image placements. Image blocks
+# only carry their bbox, the pixels are never decoded.
+PAGE_BLOCK_FLAGS = fitz.TEXTFLAGS_BLOCKS | fitz.TEXT_PRESERVE_IMAGES
+PHOTO_MIN_IMAGE_RATIO = 0.3
+FORM_MIN_BLOCKS = 8
+FORM_MAX_BLOCK_CHARS = 60
+
+
+def may_hold_photo(page):
+    doc = page.parent
+    if doc.xref_get_key(page.xref, "Resources/XObject")[0] != "null":
+        return True
+    # resources inherited from the page tree are not looked up
+    return doc.xref_get_key(page.xref, "Resources")[0] == "null"
+
+
+def page_blocks(page):
+    text_blocks = []
+    image_boxes = []
+    for x0, y0, x1, y1, text, _, kind in page.get_text("blocks", flags=PAGE_BLOCK_FLAGS):
+        if kind == 1:
+            image_boxes.append(fitz.Rect(x0, y0, x1, y1) & page.rect)
+        else:
+            text_blocks.append((fitz.Rect(x0, y0, x1, y1), text))
+    return text_blocks, image_boxes
+
+
+def classify_blocks(page, text_blocks, image_boxes):
+    image_area = sum(abs(box) for box in image_boxes)
+    if image_area >= PHOTO_MIN_IMAGE_RATIO * abs(page.rect):
+        return "photo"
+    if len(text_blocks) >= FORM_MIN_BLOCKS:
+        average = sum(len(text) for _, text in text_blocks) / len(text_blocks)
+        if average <= FORM_MAX_BLOCK_CHARS:
+            return "form"
+    return "narrative"
+
+
+def classify_page(page):
+    return classify_blocks(page, *page_blocks(page))
+
+
+# With photo_captions, photo pages keep only the text clear of their images
+# (the caption), dropping stamps and OCR layers drawn over the photo.
+def page_text(page, photo_captions=False):
+    if not photo_captions or not may_hold_photo(page):
+        return page.get_text()
+    text_blocks, image_boxes = page_blocks(page)
+    if classify_blocks(page, text_blocks, image_boxes) == "photo":
+        text_blocks = [(rect, text) for rect, text in text_blocks if not any(rect.intersects(box) for box in image_boxes)]
+    return "".join(text for _, text in text_blocks)
+
+
+# === SOURCES ===
+# A source is either the PDF bytes or the path of a PDF spooled to disk.
+# Paths are opened by filename so MuPDF maps the file instead of copying it.
+def open_source(source):
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _extract_range(location, start, stop, photo_captions=False):
+    if isinstance(location, str):
+        with fitz.open(location, filetype="pdf") as doc:
+            return [page_text(doc[i], photo_captions) for i in range(start, stop)]
+    # opened straight from the shared block, not from a private copy of it
+    shm_name, size = location
+    shm = SharedMemory(name=shm_name)
+    view = shm.buf[:size]
+    try:
+        with fitz.open(stream=view, filetype="pdf") as doc:
+            return [page_text(doc[i], photo_captions) for i in range(start, stop)]
+    finally:
+        view.release()
+        shm.close()
+
+
+def _share(blob):
+    shm = SharedMemory(create=True, size=max(1, len(blob)))
+    shm.buf[:len(blob)] = blob
+    return shm
+
+
+def _release(shared):
+    for shm in shared:
+        shm.close()
+        shm.unlink()
+
+
+# Shards already running when the consumer stops still read the shared
+# blocks, so they are unlinked once the last of them is done rather than
+# blocking the caller until then.
+def _release_when_done(shared, futures):
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            _release(shared)
+
+    if not futures:
+        _release(shared)
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _shard_records(file_index, start, future):
+    for offset, text in enumerate(future.result()):
+        yield file_index, start + offset + 1, text
+
+
+# === STREAMING PAGES ===
+# Yields (file_index, page_number, text) in upload order then page order,
+# page numbers start at 1. Serial extraction streams page by page, pooled
+# extraction streams shard by shard as soon as the next one in order is done.
+# At most two shards per worker are in flight, so when the consumer stops
+# (take_pages closing the generator) the shards not yet submitted are never
+# parsed and the queued ones are cancelled.
+def iter_pages(sources, max_workers=None, shard_min_pages=SHARD_MIN_PAGES, photo_captions=False):
+    sources = list(sources)
+    workers = max_workers or DEFAULT_WORKERS
+
+    # one task per small file, one task per page range for large files
+    tasks = []
+    for file_index, source in enumerate(sources):
+        with open_source(source) as doc:
+            page_count = doc.page_count
+        shards = 1
+        if page_count >= shard_min_pages:
+            shards = max(1, min(workers * SHARDS_PER_WORKER, page_count // MIN_SHARD_PAGES))
+        tasks.extend((file_index, start, stop) for start, stop in page_ranges(page_count, shards))
+
+    if workers <= 1 or len(tasks) <= 1:
+        for file_index, source in enumerate(sources):
+            with open_source(source) as doc:
+                for page in doc:
+                    yield file_index, page.number + 1, page_text(page, photo_captions)
+        return
+
+    # spooled files are reopened by path, in-memory ones go through shared memory
+    shared = []
+    locations = []
+    for source in sources:
+        if isinstance(source, str):
+            locations.append(source)
+        else:
+            shm = _share(source)
+            shared.append(shm)
+            locations.append((shm.name, len(source)))
+
+    pending = deque()
+    try:
+        pool = get_pool(max_workers)
+        for file_index, start, stop in tasks:
+            pending.append((file_index, start, pool.submit(_extract_range, locations[file_index], start, stop, photo_captions)))
+            if len(pending) >= 2 * workers:
+                yield from _shard_records(*pending.popleft())
+        while pending:
+            yield from _shard_records(*pending.popleft())
+    finally:
+        for _, _, future in pending:
+            future.cancel()
+        _release_when_done(shared, [future for _, _, future in pending])
+
+
+# Same records as iter_pages, but pages of files already seen are served
+# from a DiskCache keyed by the PDF bytes, extractor version and options.
+# Only the misses are opened with fitz (still pooled and sharded).
+def iter_cached_pages(sources, cache, max_workers=None, shard_min_pages=SHARD_MIN_PAGES, photo_captions=False):
+    sources = list(sources)
+    options = {"photo_captions": photo_captions}
+    keys = [content_key(source, EXTRACTOR_VERSION, options) for source in sources]
+    cached = [cache.get(key) for key in keys]
+    misses = {file_index: miss_index for miss_index, file_index in enumerate(i for i, pages in enumerate(cached) if pages is None)}
+
+    fresh = iter_pages([sources[i] for i in misses], max_workers, shard_min_pages, photo_captions)
+    pending = next(fresh, None)
+    for file_index, pages in enumerate(cached):
+        if pages is not None:
+            for page_index, text in enumerate(pages):
+                yield file_index, page_index + 1, text
+            continue
+        pages = []
+        while pending is not None and pending[0] == misses[file_index]:
+            _, page_number, text = pending
+            pages.append(text)
+            yield file_index, page_number, text
+            pending = next(fresh, None)
+        cache.put(keys[file_index], pages)
+
+
+# === LAZY EXTRACTION ===
+# Passes records through until char_budget characters have been seen or
+# every placeholder has a candidate value, then closes the upstream
+# generator so no further pages are parsed (pending shards are cancelled).
+def take_pages(records, placeholders=(), char_budget=None):
+    pending = set(placeholders)
+    seen = 0
+    try:
+        for record in records:
+            yield record
+            text = record[2]
+            seen += len(text)
+            pending = {name for name in pending if not has_candidate(name, text)}
+            if char_budget and seen >= char_budget:
+                return
+            if placeholders and not pending:
+                return
+    finally:
+        close = getattr(records, "close", None)
+        if close:
+            close()
+
+
+def join_pages(records):
+    return "".join(text for _, _, text in records)
+
@@ -0,0 +1,44 @@
+# === UPLOAD BUFFERS ===
+# Each upload is read exactly once into immutable bytes; every stage gets the
+# same object (or a memoryview of it), so nothing depends on a file's seek
+# position and nothing is parsed from a half-consumed stream.
+class UploadBuffer:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.view = memoryview(data)
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+# One per Process/Fill click. Uploads are keyed by their Streamlit file_id
+# (or the object itself), so a file handed in twice is still read once.
+# A stage that has moved an upload elsewhere (the PDF spool writing it to
+# disk) releases it, so the context does not keep those bytes alive.
+class PipelineContext:
+    def __init__(self):
+        self.buffers = {}
+        self.files_read = 0
+        self.input_bytes = 0
+
+    @staticmethod
+    def key(upload):
+        return getattr(upload, "file_id", None) or id(upload)
+
+    def read(self, upload):
+        key = self.key(upload)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            # getvalue() returns the upload's own bytes without moving its
+            # position; plain file objects fall back to a single read()
+            data = upload.getvalue() if hasattr(upload, "getvalue") else upload.read()
+            buffer = UploadBuffer(getattr(upload, "name", ""), bytes(data))
+            self.buffers[key] = buffer
+            self.files_read += 1
+            self.input_bytes += buffer.size
+        return buffer
+
+    def release(self, upload):
+        self.buffers.pop(self.key(upload), None)
@@ -0,0 +1,24 @@
+import fitz  # PyMuPDF
+
+from layout_index import LayoutIndex
+
+
+def pdf(lines):
+    doc = fitz.open()
+    page = doc.new_page()
+    for point, text in lines:
+        page.insert_text(point, text)
+    return doc.tobytes()
+
+
+# an inline "Label: value" line right under a label with a blank value must
+# not be taken as that label's value
+def test_blank_label_keeps_no_value():
+    index = LayoutIndex.from_sources([pdf([((72, 100), "Insured:"), ((72, 114), "Claim #: 12345")])])
+    assert index.field_values(["XM8_INSURED_NAME"]) == {}
+    assert index.get("Claim #") == "12345"
+
+
+def test_value_below_label():
+    index = LayoutIndex.from_sources([pdf([((72, 400), "Type of Loss:"), ((72, 414), "Wind and hail")])])
+    assert index.get("Type of Loss") == "Wind and hail"
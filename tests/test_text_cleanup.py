@@ -0,0 +1,23 @@
+from text_cleanup import strip_boilerplate
+
+
+def strip(pages):
+    records = [(0, number, text) for number, text in enumerate(pages, 1)]
+    return [text for _, _, text in strip_boilerplate(records)]
+
+
+# a captioned photo page is just the report header and its caption
+def test_photo_captions_survive():
+    pages = [f"EBERL CLAIMS SERVICE - PHOTO REPORT\nPhoto {i}: North elevation, wind damaged shingles\n" for i in range(1, 61)]
+    out = strip(pages)
+    assert all(f"Photo {i}:" in text for i, text in enumerate(out, 1))
+    assert sum("EBERL CLAIMS SERVICE" in text for text in out) == 1
+
+
+def test_body_lines_differing_in_numbers_survive():
+    pages = [f"Claim 123 - Page {i} of 100\nMeasured {i} squares on slope {i}\nWind speed {i} mph\n"
+             f"Gutter run {i} ft\nPhoto {i}\nPrinted 10/{i % 28 + 1}/2024\n" for i in range(1, 101)]
+    out = strip(pages)
+    assert all(f"Measured {i} squares" in text and f"Photo {i}\n" in text for i, text in enumerate(out, 1))
+    assert sum("Page" in text for text in out) == 1
+    assert sum("Printed" in text for text in out) == 1
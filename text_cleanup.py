@@ -0,0 +1,162 @@
+import re
+import unicodedata
+from collections import Counter
+
+# rough chars-per-token ratio for English prose, good enough for reporting
+CHARS_PER_TOKEN = 4
+
+DIGITS = re.compile(r"\d+")
+# "3", "Page 3", "Page 3 of 60", "3/60"
+PAGE_COUNTER = re.compile(r"^(?:page\s*)?\d+(?:\s*(?:of|/)\s*\d+)?$", re.IGNORECASE)
+# non-blank lines at the top and at the bottom of a page treated as header/footer
+EDGE_LINES = 2
+# what varies from page to page inside a header or footer line: "Page 3",
+# "3 of 60", "3/60", dates
+EDGE_NUMBERS = re.compile(r"\bpage\s*\d|\d\s*(?:of|/)\s*\d|\d{1,4}[.-]\d{1,2}[.-]\d{1,4}", re.IGNORECASE)
+
+
+def approx_tokens(chars):
+    return chars // CHARS_PER_TOKEN
+
+
+# === TEXT NORMALIZATION ===
+# Soft hyphens, zero-width characters and BOM are deleted, and so are lone
+# surrogates (what the old utf-8 "ignore" round trip dropped). NFKC then
+# folds ligatures and turns nbsp and the other fixed-width spaces into plain
+# spaces, line by line so the ASCII lines of a page are not re-normalized.
+# str.replace per character beats both a regex and str.translate here:
+# translate falls off its fast path as soon as a page holds any non-ASCII
+# character.
+INVISIBLE = "\u00ad\u200b\u200c\u200d\u2060\ufeff"
+SURROGATES = re.compile("[\ud800-\udfff]")
+# whitespace str.split() breaks on besides space and newline
+ODD_SPACES = ("\t", "\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x1f")
+# Every pattern starts with a literal so re finds it with its fast substring
+# search, and every replacement is a plain string so no Python callback runs
+# per match; the lowercase test on the letter before the hyphen is a
+# lookbehind placed after the literal.
+HYPHEN_WRAP = re.compile("-\n(?<=[a-z\u00df-\u00f6\u00f8-\u00ff]-\n)(?=[a-z])")
+BLANK_RUNS = re.compile("\n\n\n+")
+
+
+# For pages whose only whitespace is spaces and newlines, which is what
+# PyMuPDF returns: the same result as stripping and collapsing every line,
+# done with whole-page str.replace calls instead of a Python loop per line.
+def _collapse_spaces(text):
+    if text.endswith("\n"):
+        text = text[:-1]
+    while "  " in text:
+        text = text.replace("  ", " ")
+    if " \n" in text:
+        text = text.replace(" \n", "\n")
+    if "\n " in text:
+        text = text.replace("\n ", "\n")
+    return text.strip(" ")
+
+
+# One page at a time: each step is skipped when the page cannot need it,
+# so plain ASCII pages never pay for the Unicode passes.
+def normalize_text(text):
+    if not text.isascii():
+        for char in INVISIBLE:
+            if char in text:
+                text = text.replace(char, "")
+        try:
+            text.encode("utf-8")
+        except UnicodeEncodeError:
+            text = SURROGATES.sub("", text)
+        if not unicodedata.is_normalized("NFKC", text):
+            text = "".join(line if line.isascii() else unicodedata.normalize("NFKC", line)
+                           for line in text.splitlines(True))
+    if text.isascii() and not any(space in text for space in ODD_SPACES):
+        text = _collapse_spaces(text)
+    else:
+        text = "\n".join(map(" ".join, map(str.split, text.splitlines())))
+    if "-\n" in text:
+        text = HYPHEN_WRAP.sub("", text)
+    if "\n\n\n" in text:
+        text = BLANK_RUNS.sub("\n\n", text)
+    return text + "\n" if text else text
+
+
+def normalize_pages(records):
+    try:
+        for file_index, page_number, text in records:
+            yield file_index, page_number, normalize_text(text)
+    finally:
+        close = getattr(records, "close", None)
+        if close:
+            close()
+
+
+# === BOILERPLATE DEDUPLICATION ===
+# Lines are keyed with whitespace collapsed. Digits are masked in page
+# counters, and in header/footer lines at a page's edges that carry a page
+# number or a date, so "Page 3 of 60" and "Claim 123 - Page 4 of 60" repeat
+# from page to page. Pages with no more than 2 * EDGE_LINES lines (a photo
+# page is a header and a caption) have no body to tell edges from, so only
+# their counters are masked; captions and body lines that differ only in a
+# photo number, measurement or date stay distinct.
+def line_key(line, edge=False):
+    key = " ".join(line.split())
+    if PAGE_COUNTER.match(key) or (edge and EDGE_NUMBERS.search(key)):
+        return DIGITS.sub("#", key)
+    return key
+
+
+def page_keys(lines):
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(content[:EDGE_LINES] + content[-EDGE_LINES:]) if len(content) > 2 * EDGE_LINES else set()
+    return [line_key(line, i in edges) for i, line in enumerate(lines)]
+
+
+# Streams page records, dropping lines (headers, footers, disclaimers) found
+# on at least min_share of the pages seen so far. The first `window` pages are
+# buffered to learn the repeats before anything is emitted. The first copy of
+# each repeated line is kept, so a claim number printed in a header survives
+# once. If `stats` is given, chars_in/chars_out/lines_removed are added to it.
+def strip_boilerplate(records, min_share=0.5, window=8, stats=None):
+    if stats is None:
+        stats = {}
+    for name in ("chars_in", "chars_out", "lines_removed"):
+        stats.setdefault(name, 0)
+
+    counts = Counter()
+    kept = set()
+    pages_seen = 0
+
+    def strip(record):
+        file_index, page_number, text = record
+        threshold = max(2, min_share * pages_seen)
+        lines = []
+        page = text.splitlines(keepends=True)
+        for line, key in zip(page, page_keys(page)):
+            if key and counts[key] >= threshold:
+                if key in kept:
+                    stats["lines_removed"] += 1
+                    continue
+                kept.add(key)
+            lines.append(line)
+        stripped = "".join(lines)
+        stats["chars_in"] += len(text)
+        stats["chars_out"] += len(stripped)
+        return file_index, page_number, stripped
+
+    buffered = []
+    try:
+        for record in records:
+            counts.update(set(page_keys(record[2].splitlines())))
+            pages_seen += 1
+            if pages_seen < window:
+                buffered.append(record)
+                continue
+            for held in buffered:
+                yield strip(held)
+            buffered = []
+            yield strip(record)
+        for held in buffered:
+            yield strip(held)
+    finally:
+        close = getattr(records, "close", None)
+        if close:
+            close()